@@ -1,19 +1,57 @@
 """
-Updates ngtd db with high-confidence genes from PanelApp.
+Updates ngtd db with panel info and high-confidence genes from PanelApp.
 
 For each panel in the 'east-panels' table (type 1), this script:
-1. Retrieves high-confidence genes from the PanelApp API.
-2. Compares them with existing entries in 'east-genes'.
-3. Inserts new genes or removes obsolete ones.
-4. Logs all changes.
+1. Retrieves the latest signed-off name/version from the PanelApp API.
+2. Retrieves high-confidence genes for that signed-off version.
+3. Updates the panel name/version and compares the genes with existing
+   entries in 'east-genes'.
+4. Inserts new genes or removes obsolete ones.
+5. Logs all changes.
+
+Panel info and genes are written in the same transaction, so one run
+replaces the previous update_panels_info.py + update_genes.py sequence
+with a single API pass (one signedoff call and one genes call per panel).
 
 Supports dry-run mode to preview changes without writing to the database.
 """
 
 import argparse
-import requests
+import logging
+import sys
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+import ijson
+import requests_cache
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import psycopg2
+from psycopg2.extras import execute_batch, execute_values
 from query_db import DB_CONFIG
+from update_panels_info import (
+    UPDATE_PANEL_QUERY,
+    fetch_latest_signoff,
+    get_panel_changes,
+)
+
+# Shared session so concurrent panel fetches reuse pooled keep-alive
+# connections instead of paying a TCP+TLS handshake per request.
+# Responses are cached locally: the panel URL includes ?version=, so a
+# given (panel, version) payload is immutable and reruns (e.g. dry-run
+# previews) skip the API entirely
+SESSION = requests_cache.CachedSession("panelapp_cache", expire_after=604800)
+SESSION.mount(
+    "https://",
+    HTTPAdapter(
+        pool_connections=32,
+        pool_maxsize=32,
+        max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[502, 503, 504]),
+    ),
+)
+
+logger = logging.getLogger(__name__)
 
 
 def parse_arguments():
@@ -46,52 +84,108 @@ def get_high_confidence_genes(panel_id: int, version: str) -> list:
         f"?version={version}"
     )
     try:
-        response = requests.get(url)
+        response = SESSION.get(url, timeout=10)
         response.raise_for_status()
-        panel_data = response.json()
 
+        # Parse the genes array incrementally from the buffered body
+        # instead of building the whole document with response.json();
+        # only the matching hgnc ids are materialized. The cached session
+        # buffers the full body to store it anyway, and feeding
+        # response.raw to ijson truncates on cache hits (its read(0)
+        # probe makes the replay buffer report EOF), so parse from
+        # response.content
+
+        # gene_data is looked up once per gene via the inner single-element
+        # for, instead of one membership test plus two subscript lookups
         high_confidence_genes = [
-            gene["gene_data"]["hgnc_id"]
-            for gene in panel_data["genes"]
-            if (
-                gene.get("confidence_level") == "3" 
-                and "gene_data" in gene 
-                and "hgnc_id" in gene["gene_data"]
-            )
+            gene_data["hgnc_id"]
+            for gene in ijson.items(BytesIO(response.content), "genes.item")
+            if gene.get("confidence_level") == "3"
+            for gene_data in (gene.get("gene_data"),)
+            if isinstance(gene_data, dict) and "hgnc_id" in gene_data
         ]
         return high_confidence_genes
     except Exception as e:
-        print(f"Error fetching data for panel {panel_id}: {e}")
+        logger.error("Error fetching data for panel %s: %s", panel_id, e)
         return []
 
 
-def get_existing_genes_for_panel(
-    east_panel_id: int, cursor: psycopg2.extensions.cursor
-) -> set:
-    """Get existing genes for a panel from the database.
+def hgnc_to_key(hgnc_id: str) -> int:
+    """Strip the constant "HGNC:" prefix, returning the integer key.
+
+    The set diffs operate on these integers rather than full strings:
+    cheaper to hash and compare, and a much smaller working set for the
+    largest panels.
 
     Args:
-        east_panel_id (int): primary key of panel in "east-panels" table
+        hgnc_id (str): hgnc id in "HGNC:<int>" form
+
+    Returns:
+        int: the numeric part of the id
+    """
+    return int(hgnc_id[5:])
+
+
+def key_to_hgnc(key: int) -> str:
+    """Rebuild the "HGNC:<int>" id from an integer key.
+
+    Args:
+        key (int): the numeric part of the id
+
+    Returns:
+        str: hgnc id in "HGNC:<int>" form
+    """
+    return f"HGNC:{key}"
+
+
+def fetch_panel(row: tuple) -> tuple:
+    """Fetch the latest signoff and high-confidence genes for one panel.
+
+    The version returned by the signedoff endpoint drives the gene fetch,
+    so panel info and genes stay in step with a single API pass.
+
+    Args:
+        row (tuple): ("id", "panel-id", "panel-name", "panel-version") row
+        from the "east-panels" table.
+
+    Returns:
+        tuple: (row, new_name, new_version, hgnc_ids)
+    """
+    panel_id, current_version = row[1], row[3]
+    new_name, new_version, _ = fetch_latest_signoff(panel_id)
+
+    version = new_version or current_version
+    hgnc_ids = get_high_confidence_genes(panel_id, version) if version else []
+
+    return row, new_name, new_version, hgnc_ids
+
+
+def get_existing_genes(
+    east_panel_ids: list, cursor: psycopg2.extensions.cursor
+) -> dict:
+    """Get existing genes for all panels from the database in one query.
+
+    Args:
+        east_panel_ids (list[int]): primary keys of panels in "east-panels" table
         cursor (psycopg2.extensions.cursor): A database cursor object
 
     Returns:
-        set[str]: Set of existing hgnc ids for the panel
+        dict[int, set[int]]: Mapping of east panel id to its existing hgnc
+        ids as integer keys (see hgnc_to_key)
     """
-    try:
-        cursor.execute(
-            """
-            SELECT "hgnc-id" 
-            FROM "testdirectory"."east-genes" 
-            WHERE "east-panel-id" = %s
-            """,
-            (east_panel_id,),
-        )
-        existing_genes = {row[0] for row in cursor.fetchall()}
-        print(f"Found {len(existing_genes)} genes for panel {east_panel_id} in db")
-        return existing_genes
-    except Exception as e:
-        print(f"Error fetching genes for panel {east_panel_id}: {e}")
-        return set()
+    cursor.execute(
+        """
+        SELECT "east-panel-id", "hgnc-id"
+        FROM "testdirectory"."east-genes"
+        WHERE "east-panel-id" = ANY(%s)
+        """,
+        (east_panel_ids,),
+    )
+    existing_genes = defaultdict(set)
+    for east_panel_id, hgnc_id in cursor.fetchall():
+        existing_genes[east_panel_id].add(hgnc_to_key(hgnc_id))
+    logger.info("Found existing genes for %d panels in db", len(existing_genes))
+    return existing_genes
 
 
 def add_genes_to_panel(
@@ -104,30 +198,45 @@ def add_genes_to_panel(
 
     Args:
         east_panel_id (int): Panel identifier.
-        genes_to_add (set): Genes to insert.
+        genes_to_add (set[int]): Integer keys of genes to insert.
         cursor (psycopg2.extensions.cursor): Database cursor object.
         dry_run (bool): If True, simulate only.
     """
-    for hgnc_id in genes_to_add:
-        try:
-            if dry_run:
-                print(f"[DRY-RUN ADD] Panel {east_panel_id}: Would add gene {hgnc_id}")
-            else:
-                cursor.execute(
-                    """
-                    INSERT INTO "testdirectory"."east-genes" ("east-panel-id", "hgnc-id")
-                    VALUES (%s, %s)
-                """,
-                    (east_panel_id, hgnc_id),
-                )
-                print(f"[ADD] Panel {east_panel_id}: Added gene {hgnc_id}")
+    if dry_run:
+        logger.info(
+            "[DRY-RUN ADD] Panel %s: Would add %d genes: %s",
+            east_panel_id,
+            len(genes_to_add),
+            ", ".join(key_to_hgnc(key) for key in sorted(genes_to_add)),
+        )
+        return
 
-        except psycopg2.IntegrityError:
-            print(
-                f"[SKIP DUPLICATE] Panel {east_panel_id}: Gene {hgnc_id} already exists"
+    try:
+        # Single batched INSERT instead of one round-trip per gene;
+        # ON CONFLICT DO NOTHING replaces the per-row IntegrityError catch
+        # and RETURNING reports the rows actually inserted
+        inserted = execute_values(
+            cursor,
+            """
+            INSERT INTO "testdirectory"."east-genes" ("east-panel-id", "hgnc-id")
+            VALUES %s
+            ON CONFLICT DO NOTHING
+            RETURNING "hgnc-id"
+        """,
+            [(east_panel_id, key_to_hgnc(key)) for key in genes_to_add],
+            page_size=500,
+            fetch=True,
+        )
+        logger.info("[ADD] Panel %s: Added %d genes", east_panel_id, len(inserted))
+        if len(inserted) < len(genes_to_add):
+            logger.info(
+                "[SKIP DUPLICATE] Panel %s: %d genes already exist",
+                east_panel_id,
+                len(genes_to_add) - len(inserted),
             )
-        except Exception as e:
-            print(f"Error adding gene {hgnc_id} to panel {east_panel_id}: {e}")
+    except Exception as e:
+        logger.error("Error adding genes to panel %s: %s", east_panel_id, e)
+        raise
 
 
 def remove_genes_from_panel(
@@ -140,37 +249,47 @@ def remove_genes_from_panel(
 
     Args:
         east_panel_id (int): Panel identifier.
-        genes_to_remove (set): Genes to remove.
+        genes_to_remove (set[int]): Integer keys of genes to remove.
         cursor (psycopg2.extensions.cursor): Database cursor object.
         dry_run (bool): If True, simulate only.
     """
-    for hgnc_id in genes_to_remove:
-        try:
-            if dry_run:
-                print(
-                    f"[DRY-RUN REMOVE] Panel {east_panel_id}: Would remove gene {hgnc_id}"
-                )
-            else:
-                cursor.execute(
-                    """
-                    DELETE FROM "testdirectory"."east-genes"
-                    WHERE "east-panel-id" = %s AND "hgnc-id" = %s
-                """,
-                    (east_panel_id, hgnc_id),
-                )
-                if cursor.rowcount > 0:
-                    print(f"[REMOVE] Panel {east_panel_id}: Removed gene {hgnc_id}")
-                else:
-                    print(
-                        f"[SKIP REMOVE] Panel {east_panel_id}: Gene {hgnc_id} not found in DB"
-                    )
-        except Exception as e:
-            print(f"Error removing gene {hgnc_id} from panel {east_panel_id}: {e}")
+    if dry_run:
+        logger.info(
+            "[DRY-RUN REMOVE] Panel %s: Would remove %d genes: %s",
+            east_panel_id,
+            len(genes_to_remove),
+            ", ".join(key_to_hgnc(key) for key in sorted(genes_to_remove)),
+        )
+        return
+
+    try:
+        # Single DELETE bound to a PostgreSQL array instead of one
+        # round-trip per gene
+        cursor.execute(
+            """
+            DELETE FROM "testdirectory"."east-genes"
+            WHERE "east-panel-id" = %s AND "hgnc-id" = ANY(%s)
+        """,
+            (east_panel_id, [key_to_hgnc(key) for key in genes_to_remove]),
+        )
+        logger.info(
+            "[REMOVE] Panel %s: Removed %d genes", east_panel_id, cursor.rowcount
+        )
+        if cursor.rowcount < len(genes_to_remove):
+            logger.info(
+                "[SKIP REMOVE] Panel %s: %d genes not found in DB",
+                east_panel_id,
+                len(genes_to_remove) - cursor.rowcount,
+            )
+    except Exception as e:
+        logger.error("Error removing genes from panel %s: %s", east_panel_id, e)
+        raise
 
 
 def update_db_genes(
     east_panel_id: int,
     hgnc_ids: list[str],
+    db_genes: set,
     cursor: psycopg2.extensions.cursor,
     dry_run: bool = True,
 ) -> None:
@@ -179,72 +298,137 @@ def update_db_genes(
     Args:
         east_panel_id (int): primary key of panel in "east-panels" table
         hgnc_ids (List[str]): list of hgnc ids from panelapp
+        db_genes (set[int]): existing hgnc ids for the panel in the
+        database, as integer keys (see hgnc_to_key)
         cursor (psycopg2.extensions.cursor): A database cursor object used to execute
         SQL queries.
         dry_run (bool): If True, simulate only.
     """
+    savepoint_set = False
     try:
-        if not dry_run:
-            cursor.execute(f"SAVEPOINT panel_{east_panel_id}")
+        panelapp_genes = frozenset(map(hgnc_to_key, hgnc_ids))
 
-        db_genes = get_existing_genes_for_panel(east_panel_id, cursor)
-        panelapp_genes = set(hgnc_ids)
+        # Steady state: nothing changed, skip without materializing the
+        # two difference sets
+        if not panelapp_genes ^ db_genes:
+            logger.info("[NO CHANGE] Panel %s: Genes are up to date.", east_panel_id)
+            return
 
+        # The diff stays client-side (rather than a temp-table anti-join in
+        # Postgres) so dry-run mode can preview per-gene changes; the
+        # existing genes are already fetched in one batched query upfront
         genes_to_add = panelapp_genes - db_genes
         genes_to_remove = db_genes - panelapp_genes
 
-        if not genes_to_add and not genes_to_remove:
-            print(f"[NO CHANGE] Panel {east_panel_id}: Genes are up to date.")
-            return
+        # Only set a savepoint once we know there is something to write;
+        # unchanged panels skip the SAVEPOINT/RELEASE round-trips entirely
+        if not dry_run:
+            cursor.execute(f"SAVEPOINT panel_{east_panel_id}")
+            savepoint_set = True
 
         if genes_to_add:
             add_genes_to_panel(east_panel_id, genes_to_add, cursor, dry_run)
         if genes_to_remove:
             remove_genes_from_panel(east_panel_id, genes_to_remove, cursor, dry_run)
 
+        if savepoint_set:
+            cursor.execute(f"RELEASE SAVEPOINT panel_{east_panel_id}")
+
     except Exception as e:
-        print(f"[ERROR] Panel {east_panel_id}: Rolling back changes due to error: {e}")
-        if not dry_run:
+        logger.error(
+            "[ERROR] Panel %s: Rolling back changes due to error: %s",
+            east_panel_id,
+            e,
+        )
+        if savepoint_set:
             cursor.execute(f"ROLLBACK TO SAVEPOINT panel_{east_panel_id}")
 
 
 def main():
     """Entry point"""
     args = parse_arguments()
+    # Log to stdout so the run's output shares one stream with the print
+    # calls in the helpers reused from update_panels_info.py
+    logging.basicConfig(level=logging.INFO, format="%(message)s", stream=sys.stdout)
 
     try:
         with psycopg2.connect(**DB_CONFIG) as conn:
             with conn.cursor() as cursor:
-                print("Connected to the database successfully.")
-
-                # Select only PanelApp panels (panel-type-id = 1) for update
-                cursor.execute(
+                logger.info("Connected to the database successfully.")
+
+                # Bulk sync: skip the WAL flush on COMMIT. Safe because the
+                # script is an idempotent diff and can simply be re-run if a
+                # crash loses the (acknowledged) commit
+                cursor.execute("SET LOCAL synchronous_commit = OFF")
+
+                # Select only PanelApp panels (panel-type-id = 1) for update,
+                # streamed from a server-side cursor so PanelApp fetches start
+                # while rows are still arriving (named cursors cannot run the
+                # DML below, hence the separate regular cursor)
+                with conn.cursor(name="panels_cur") as panels_cursor:
+                    panels_cursor.itersize = 256
+                    panels_cursor.execute(
+                        """
+                        SELECT "id", "panel-id", "panel-name", "panel-version"
+                        FROM testdirectory."east-panels"
+                        WHERE "panel-type-id" = 1
                     """
-                    SELECT "id", "panel-id", "panel-version"
-                    FROM testdirectory."east-panels"
-                    WHERE "panel-type-id" = 1
-                """
-                )
+                    )
 
-                panel_data = cursor.fetchall()
+                    # Panels are independent, so fetch from PanelApp
+                    # concurrently; the DB writes below stay on the
+                    # single-threaded cursor
+                    with ThreadPoolExecutor(max_workers=16) as executor:
+                        results = list(executor.map(fetch_panel, panels_cursor))
 
-                # fetchall() returns a list of tuples,
-                for east_panel_id, panel_id, version in panel_data:
-                    print(f"\nProcessing panel {panel_id}...")
+                # One round-trip for all panels' existing genes instead of
+                # one SELECT per panel
+                existing_genes = get_existing_genes(
+                    [row[0] for row, *_ in results], cursor
+                )
 
-                    hgnc_ids = get_high_confidence_genes(panel_id, version)
+                panel_update_rows = []
+                for row, new_name, new_version, hgnc_ids in results:
+                    east_panel_id, panel_id, current_name, current_version = row
+                    logger.info("\nProcessing panel %s...", panel_id)
+
+                    if new_name or new_version:
+                        update_row = get_panel_changes(
+                            panel_id,
+                            current_name,
+                            current_version,
+                            new_name,
+                            new_version,
+                            args.dry_run,
+                        )
+                        if update_row:
+                            panel_update_rows.append(update_row)
 
                     if hgnc_ids:
-                        update_db_genes(east_panel_id, hgnc_ids, cursor, args.dry_run)
+                        update_db_genes(
+                            east_panel_id,
+                            hgnc_ids,
+                            existing_genes[east_panel_id],
+                            cursor,
+                            args.dry_run,
+                        )
+
+                # Panel name/version refresh goes into the same transaction
+                # as the gene changes
+                if panel_update_rows and not args.dry_run:
+                    execute_batch(
+                        cursor, UPDATE_PANEL_QUERY, panel_update_rows, page_size=200
+                    )
+                    logger.info("Updated info for %d panels", len(panel_update_rows))
 
                 if not args.dry_run:
                     conn.commit()
-                    print("Changes committed to the database.")
+                    logger.info("Changes committed to the database.")
                 else:
-                    print("\n[DRY RUN] No changes committed.")
+                    logger.info("\n[DRY RUN] No changes committed.")
 
     except Exception as e:
-        print(f"Error connecting to database: {e}")
+        logger.error("Error connecting to database: %s", e)
 
 
 if __name__ == "__main__":
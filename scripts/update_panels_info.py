@@ -11,10 +11,24 @@ update fails.
 
 import argparse
 import psycopg2
+from psycopg2.extras import execute_batch
 import requests
-import pandas as pd
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from query_db import DB_CONFIG
 
+# Shared session so repeated signoff lookups reuse pooled keep-alive
+# connections and retry transient 5xx responses
+SESSION = requests.Session()
+SESSION.mount(
+    "https://",
+    HTTPAdapter(
+        pool_connections=32,
+        pool_maxsize=32,
+        max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[502, 503, 504]),
+    ),
+)
+
 
 def fetch_latest_signoff(panel_id: int) -> tuple:
     """
@@ -31,7 +45,7 @@ def fetch_latest_signoff(panel_id: int) -> tuple:
         f"?panel_id={panel_id}"
     )
     try:
-        response = requests.get(url, timeout=30)
+        response = SESSION.get(url, timeout=30)
         if response.status_code == 200:
             data = response.json()
             if data.get("results"):
@@ -51,58 +65,59 @@ def fetch_latest_signoff(panel_id: int) -> tuple:
     return None, None, None
 
 
-def update_panel_info(
-    cursor: psycopg2.extensions.cursor,
+UPDATE_PANEL_QUERY = """
+    UPDATE testdirectory."east-panels"
+    SET "panel-name" = COALESCE(%s, "panel-name"),
+        "panel-version" = COALESCE(%s, "panel-version")
+    WHERE "panel-id" = %s
+"""
+
+
+def get_panel_changes(
     panel_id: int,
     current_name: str,
     current_version: str,
     new_name: str,
     new_version: str,
     dry_run: bool = True,
-) -> None:
+) -> tuple:
     """
-    Update panel information in the database.
+    Work out what changed for a panel and return the update parameters.
 
     Args:
-        cursor (psycopg2.extensions.cursor): Database cursor object
         panel_id (int): Panel ID to update
         current_name (str): Current panel name in database
         current_version (str): Current panel version in database
         new_name (str): New panel name from API
         new_version (str): New panel version from API
         dry_run (bool): If True, only print changes (default)
+
+    Returns:
+        tuple: (new_name, new_version, panel_id) parameters for
+        UPDATE_PANEL_QUERY, or None if nothing changed. Unchanged fields
+        are None so COALESCE keeps the current value.
     """
-    updates = []
-    params = []
     changes = []
 
-    if new_name and new_name != current_name:
-        updates.append('"panel-name" = %s')
-        params.append(new_name)
+    if not (new_name and new_name != current_name):
+        new_name = None
+    else:
         changes.append(f"name from '{current_name}' to '{new_name}'")
 
-    if new_version and new_version != current_version:
-        updates.append('"panel-version" = %s')
-        params.append(new_version)
+    if not (new_version and new_version != current_version):
+        new_version = None
+    else:
         changes.append(f"version from {current_version} to {new_version}")
 
-    if updates:
-        update_query = f"""
-        UPDATE testdirectory."east-panels"
-        SET {', '.join(updates)}
-        WHERE "panel-id" = %s
-        """
-        params.append(panel_id)
+    if not changes:
+        return None
 
-        if dry_run:
-            print(f"[DRY RUN] Would update panel {panel_id}: {', '.join(changes)}")
-        else:
-            try:
-                cursor.execute(update_query, params)
-                print(f"Updated panel {panel_id}: {', '.join(changes)}")
-            except Exception as e:
-                print(f"Error updating panel {panel_id}: {e}")
-                raise
+    if dry_run:
+        print(f"[DRY RUN] Would update panel {panel_id}: {', '.join(changes)}")
+    else:
+        print(f"Updating panel {panel_id}: {', '.join(changes)}")
+
+    return (new_name, new_version, panel_id)
 
 
 def parse_arguments():
@@ -136,13 +151,14 @@ def main():
                 )
                 panel_data = cursor.fetchall()
 
-                # Fetch latest signoff data for each panel ID
+                # Fetch latest signoff data for each panel ID and collect
+                # the changed rows for one batched UPDATE
+                update_rows = []
                 for panel_id, current_name, current_version in panel_data:
                     new_name, new_version, _ = fetch_latest_signoff(panel_id)
 
                     if new_name or new_version:
-                        update_panel_info(
-                            cursor,
+                        row = get_panel_changes(
                             panel_id,
                             current_name,
                             current_version,
@@ -150,6 +166,14 @@ def main():
                             new_version,
                             args.dry_run,
                         )
+                        if row:
+                            update_rows.append(row)
+
+                if update_rows and not args.dry_run:
+                    execute_batch(
+                        cursor, UPDATE_PANEL_QUERY, update_rows, page_size=200
+                    )
+                    print(f"Updated {len(update_rows)} panels")
 
                 if not args.dry_run:
                     conn.commit()
@@ -0,0 +1,10 @@
+-- Composite index backing the gene sync queries in update_genes.py:
+--   SELECT "east-panel-id", "hgnc-id" ... WHERE "east-panel-id" = ANY(%s)
+--   DELETE ... WHERE "east-panel-id" = %s AND "hgnc-id" = ANY(%s)
+-- Both columns are key columns, so the select and the delete lookup can be
+-- satisfied with index-only scans instead of sequential scans of east-genes.
+--
+-- CREATE INDEX CONCURRENTLY cannot run inside a transaction block; run this
+-- with autocommit (plain psql, no surrounding BEGIN).
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_east_genes_panel_hgnc
+    ON "testdirectory"."east-genes" ("east-panel-id", "hgnc-id");